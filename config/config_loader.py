@@ -4,45 +4,123 @@
 # =========================================
 
 import os                      # Used to read ENV to pick dev/prod and to resolve ${VAR} placeholders
-import re                      # Used to find and replace ${VAR} patterns inside YAML text
+import json                    # Used for the parsed-config cache sidecar (much faster to load than YAML)
 import sys                     # Used to exit early with a clear error message on invalid config
+from functools import lru_cache  # Used to build the config once per process (per environment)
 from typing import Dict, Any   # Type hints for better readability and tooling
 import yaml                    # Safe YAML parsing (install: PyYAML)
 
+# Prefer the libyaml-backed C loader (native parsing); fall back to the pure-Python one
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+def _placeholder_end(text: str, start: int) -> int:
+    """
+    Given text[start:start+2] == "${", return the index of the closing "}" if a valid
+    ${VAR} starts there (non-empty name, no nested "{"), else -1.
+    """
+    end = text.find("}", start + 2)                            # Closing brace of this placeholder
+    if end == -1 or end == start + 2 or "{" in text[start + 2:end]:
+        return -1
+    return end
+
 def _substitute_env_placeholders(yaml_text: str) -> str:
     """
     Replace ${VAR} placeholders in YAML text with their environment variable values.
     If an env var is missing, mark it as <MISSING:VAR> to fail validation cleanly.
+    Single linear scan with str.find (no regex, no per-match callback).
     """
-    # Compile a regex to match ${SOME_NAME} patterns
-    pattern = re.compile(r"\$\{([^}^{]+)\}")
-    # Define a replacement function that receives the regex match
-    def repl(match):
-        var_name = match.group(1)                              # Extract VAR name from ${VAR}
-        return os.getenv(var_name, f"<MISSING:{var_name}>")    # Return env value or a sentinel
-    # Run the substitution across the entire YAML text
-    return pattern.sub(repl, yaml_text)
+    if "${" not in yaml_text:                                  # Fast path: no placeholders at all
+        return yaml_text
 
-def _load_yaml_file(path: str) -> Dict[str, Any]:
+    parts = []                                                 # Output slices, joined once at the end
+    pos = 0                                                    # Start of the not-yet-copied text
+    start = yaml_text.find("${")
+    while start != -1:
+        end = _placeholder_end(yaml_text, start)
+        if end == -1:                                          # Not a placeholder: keep scanning
+            start = yaml_text.find("${", start + 1)
+            continue
+        var_name = yaml_text[start + 2:end]                    # Extract VAR name from ${VAR}
+        parts.append(yaml_text[pos:start])                     # Literal text before the placeholder
+        parts.append(os.getenv(var_name, f"<MISSING:{var_name}>"))  # Env value or a sentinel
+        pos = end + 1
+        start = yaml_text.find("${", pos)
+    parts.append(yaml_text[pos:])                              # Trailing literal text
+    return "".join(parts)
+
+# Keys whose substituted value is converted to int (everything else stays a string)
+_INT_KEYS = {"port"}
+
+def _substitute_in_tree(node: Any, key: str = "") -> Any:
     """
-    Read a YAML file from disk, perform ${VAR} substitution, and parse it to a dict.
+    Apply ${VAR} substitution to every string inside an already-parsed YAML tree.
+    Substituted env values stay strings (a password like "0123" or "yes" is not
+    re-typed); only known numeric keys (e.g. `port: ${PGPORT}`) become ints.
     """
-    if not os.path.exists(path):                               # Ensure the path exists
-        print(f"❌ Configuration file not found: {path}")       # Clear error message
-        sys.exit(1)                                            # Fail fast (exercise asks for validation)
+    if isinstance(node, dict):                                 # Recurse into mappings
+        return {k: _substitute_in_tree(v, k) for k, v in node.items()}
+    if isinstance(node, list):                                 # Recurse into sequences
+        return [_substitute_in_tree(v, key) for v in node]
+    if not isinstance(node, str) or "${" not in node:          # Nothing to substitute
+        return node
+
+    substituted = _substitute_env_placeholders(node)           # Replace ${VAR} with env values
+    if key in _INT_KEYS:                                       # e.g. port: ${PGPORT}
+        try:
+            return int(substituted)
+        except ValueError:
+            return substituted                                 # e.g. <MISSING:PGPORT>: validation reports it
+    return substituted
+
+def _parse_yaml_cached(path: str) -> Any:
+    """
+    Parse a YAML file *before* env substitution, caching the result in a JSON sidecar
+    (<path>.cache.json) that is rebuilt only when the YAML file is newer than the cache.
+    The sidecar never contains env values (secrets stay out of the filesystem).
+    """
+    cache_path = path + ".cache.json"                          # e.g. config/dev.yaml.cache.json
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            with open(cache_path, "r", encoding="utf-8") as f: # Fast path: JSON instead of YAML
+                return json.load(f)
+    except (OSError, ValueError):                              # Missing/corrupt cache -> rebuild
+        pass
 
     with open(path, "r", encoding="utf-8") as f:               # Open the YAML file safely
         raw = f.read()                                         # Read the entire file into a string
 
-    substituted = _substitute_env_placeholders(raw)            # Replace ${VAR} with env values
-
     try:
-        cfg = yaml.safe_load(substituted)                      # Parse YAML text into Python dict
+        parsed = yaml.load(raw, Loader=_Loader)                # Parse YAML text into Python dict (safe loader)
     except yaml.YAMLError as e:                                # Catch YAML syntax errors
         print(f"❌ YAML parsing error in {path}: {e}")          # Print where and why it failed
         sys.exit(1)                                            # Exit to force a fix
 
-    return cfg                                                 # Return the parsed dict
+    try:
+        encoded = json.dumps(parsed)                           # Only cache trees that survive a JSON round trip
+        if json.loads(encoded) == parsed:
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(encoded)
+            os.replace(tmp_path, cache_path)                   # Atomic publish (no half-written cache)
+    except (TypeError, ValueError, OSError) as e:              # Unserializable values or read-only dir
+        print(f"⚠️ Config cache not written for {path}: {e}")
+
+    return parsed
+
+def _load_yaml_file(path: str) -> Dict[str, Any]:
+    """
+    Read a YAML file from disk (via the JSON cache when fresh), perform ${VAR} substitution,
+    and return it as a dict.
+    """
+    if not os.path.exists(path):                               # Ensure the path exists
+        print(f"❌ Configuration file not found: {path}")       # Clear error message
+        sys.exit(1)                                            # Fail fast (exercise asks for validation)
+
+    parsed = _parse_yaml_cached(path)                          # YAML tree with ${VAR} still in place
+    return _substitute_in_tree(parsed)                         # Replace ${VAR} with env values
 
 def _validate_config(cfg: Dict[str, Any]) -> None:
     """
@@ -72,16 +150,25 @@ def _validate_config(cfg: Dict[str, Any]) -> None:
         print("❌ S3 bucket not provided (or placeholder unresolved).")       # Clear guidance
         sys.exit(1)                                                          # Exit until fixed
 
-def get_config() -> Dict[str, Any]:
+@lru_cache(maxsize=2)
+def _get_config_for_env(env: str) -> Dict[str, Any]:
     """
-    Public API: pick env from ENV (default 'dev'), load YAML, validate, return dict.
+    Load + validate the config for one environment; memoized so it is built once per process.
     """
-    env = os.getenv("ENV", "dev").lower()                     # Choose 'dev' or 'prod' by ENV variable
     path = f"config/{env}.yaml"                               # Build path like config/dev.yaml
     cfg = _load_yaml_file(path)                               # Load + parse YAML file to dict
     _validate_config(cfg)                                     # Validate presence of required keys
     return cfg                                                # Return configuration dictionary
 
+def get_config() -> Dict[str, Any]:
+    """
+    Public API: pick env from ENV (default 'dev'), load YAML, validate, return dict.
+    The dict is shared across callers (process-wide singleton) — treat it as read-only;
+    copy it (e.g. {**cfg, ...}) before changing anything.
+    """
+    env = os.getenv("ENV", "dev").lower()                     # Choose 'dev' or 'prod' by ENV variable
+    return _get_config_for_env(env)                           # Cached after the first call
+
 def build_db_url(cfg: Dict[str, Any]) -> str:
     """
     Helper to build a SQLAlchemy-friendly PostgreSQL URL string from cfg dict.
@@ -6,10 +6,12 @@
 # =========================================
 
 import os
+import re
 import sys
 import logging
 import argparse
 from contextlib import contextmanager
+from functools import lru_cache
 
 from sqlalchemy import (
     create_engine,
@@ -22,9 +24,9 @@ from sqlalchemy import (
     ForeignKey,
     Column,
     UniqueConstraint,
-    Index,
     func,
 )
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base, relationship
 
 # --- NEW IMPORT ---
@@ -33,25 +35,36 @@ from config.config_loader import get_config, build_db_url
 
 
 # -----------------------
-# Configuration & Logging
+# Logging
 # -----------------------
 
-# 1️⃣ Load the YAML configuration (dev.yaml or prod.yaml)
-#    - It automatically detects the environment from ENV variable (ENV=dev or ENV=prod)
-cfg = get_config()
-
-# 2️⃣ Setup logging based on config values
-logging.basicConfig(
-    level=cfg["log_level"],  # Uses "DEBUG" or "INFO" from YAML
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+# Config is loaded lazily in main() (not at import), so `--help`, argparse errors and
+# importing this module for tests don't pay for YAML parsing + validation.
 log = logging.getLogger(__name__)
 
-# 3️⃣ Get the schema name from the configuration file
-SCHEMA = cfg["db_schema"]
+# Full-line "-- ..." SQL comments (compiled once; used by create_views_from_file)
+_SQL_COMMENT = re.compile(r"(?m)^\s*--[^\n]*\n?")
+
+# Number of analytics SQL blocks sent to the server in one round trip
+SQL_BATCH_SIZE = 16
+
+# Secondary indexes, created with CREATE INDEX CONCURRENTLY (see create_indexes_concurrently)
+# (index name, table, column) — "{schema}" is filled in at runtime
+SECONDARY_INDEXES = [
+    ("ix_{schema}_produtos_categoria", "produtos", "categoria"),
+    ("ix_transacoes_id_cliente", "transacoes", "id_cliente"),
+    ("ix_transacoes_data_hora", "transacoes", "data_hora"),
+    ("ix_transacao_itens_id_transacao", "transacao_itens", "id_transacao"),
+    ("ix_transacao_itens_id_produto", "transacao_itens", "id_produto"),
+]
 
-# 4️⃣ Initialize SQLAlchemy base class for ORM mapping
-Base = declarative_base()
+
+def _mask_password(db_url: str) -> str:
+    """
+    Render a DB URL with the password replaced by '***' (parsed, not substring-replaced,
+    so a password that also appears in the host/db name can't leak or mangle the log).
+    """
+    return make_url(db_url).render_as_string(hide_password=True)
 
 
 # To ensure that the database exists
@@ -81,8 +94,7 @@ def ensure_database_exists(cfg):
             admin_url = build_db_url(admin_cfg)
 
             # mascarar password no log
-            pw = str(cfg["database"]["password"])
-            masked = admin_url.replace(pw, "***")
+            masked = _mask_password(admin_url)
             log.info(
                 f"Ensuring database '{target_db}' exists (admin connect: {masked})"
             )
@@ -125,110 +137,138 @@ def ensure_database_exists(cfg):
 # -----------------------
 
 
-class Cliente(Base):
-    """Table for customers"""
-
-    __tablename__ = "clientes"
-    __table_args__ = (
-        UniqueConstraint("email", name="uq_clientes_email"),  # Ensure unique emails
-        {"schema": SCHEMA},  # Use schema from YAML (e.g., "public" or "shopflow")
-    )
-
-    id = Column(Integer, primary_key=True)
-    nome = Column(String, nullable=False)
-    email = Column(String, nullable=False)
-    data_registo = Column(Date, nullable=False)
-    distrito = Column(String, nullable=False)
-    version_timestamp = Column(
-        DateTime(timezone=True),
-        nullable=False,
-        server_default=func.now(),  # auto-fill with current timestamp on insert
-    )
-
-    transacoes = relationship(
-        "Transacao", back_populates="cliente", cascade="all, delete-orphan"
-    )
-
-
-class Produto(Base):
-    """Table for products"""
-
-    __tablename__ = "produtos"
-    __table_args__ = ({"schema": SCHEMA},)
-
-    id = Column(Integer, primary_key=True)
-    nome = Column(String, nullable=False)
-    categoria = Column(String, index=True, nullable=False)
-    preco = Column(Numeric(10, 2), nullable=False)
-    fornecedor = Column(String, nullable=False)
-    version_timestamp = Column(
-        DateTime(timezone=True),
-        nullable=False,
-        server_default=func.now(),  # auto-fill with current timestamp on insert
-    )
-
-    itens_transacao = relationship(
-        "TransacaoItem", back_populates="produto", cascade="all, delete-orphan"
-    )
-
-
-class Transacao(Base):
-    """Table for transactions (main order table)"""
-
-    __tablename__ = "transacoes"
-    __table_args__ = (
-        Index("ix_transacoes_id_cliente", "id_cliente"),
-        Index("ix_transacoes_data_hora", "data_hora"),
-        {"schema": SCHEMA},
-    )
-
-    id = Column(Integer, primary_key=True)
-    id_cliente = Column(
-        Integer, ForeignKey(f"{SCHEMA}.clientes.id", ondelete="CASCADE"), nullable=False
-    )
-    data_hora = Column(DateTime, nullable=False)
-    metodo_pagamento = Column(String, nullable=False)
-    version_timestamp = Column(
-        DateTime(timezone=True),
-        nullable=False,
-        server_default=func.now(),  # auto-fill with current timestamp on insert
-    )
-
-    cliente = relationship("Cliente", back_populates="transacoes")
-    itens = relationship(
-        "TransacaoItem", back_populates="transacao", cascade="all, delete-orphan"
-    )
-
-
-class TransacaoItem(Base):
-    """Table for transaction items (each product per transaction)"""
-
-    __tablename__ = "transacao_itens"
-    __table_args__ = (
-        Index("ix_transacao_itens_id_transacao", "id_transacao"),
-        Index("ix_transacao_itens_id_produto", "id_produto"),
-        {"schema": SCHEMA},
-    )
-
-    id = Column(Integer, primary_key=True)
-    id_transacao = Column(
-        Integer,
-        ForeignKey(f"{SCHEMA}.transacoes.id", ondelete="CASCADE"),
-        nullable=False,
-    )
-    id_produto = Column(
-        Integer, ForeignKey(f"{SCHEMA}.produtos.id", ondelete="CASCADE"), nullable=False
-    )
-    quantidade = Column(Integer, nullable=False)
-    preco_unitario = Column(Numeric(10, 2), nullable=False)
-    version_timestamp = Column(
-        DateTime(timezone=True),
-        nullable=False,
-        server_default=func.now(),  # auto-fill with current timestamp on insert
-    )
-
-    transacao = relationship("Transacao", back_populates="itens")
-    produto = relationship("Produto", back_populates="itens_transacao")
+@lru_cache(maxsize=None)
+def build_models(schema: str) -> dict:
+    """
+    Define the ORM models for the given schema (called from main() once the config is
+    loaded, so the schema name is not needed at import time).
+    Each schema gets its own declarative Base/MetaData, so the models can be built for
+    several schemas in one process; results are cached per schema.
+    Returns the model classes keyed by class name, plus their "metadata".
+    """
+    # Initialize SQLAlchemy base class for ORM mapping (one per schema)
+    Base = declarative_base()
+
+    class Cliente(Base):
+        """Table for customers"""
+
+        __tablename__ = "clientes"
+        __table_args__ = (
+            UniqueConstraint("email", name="uq_clientes_email"),  # Ensure unique emails
+            {"schema": schema},  # Use schema from YAML (e.g., "public" or "shopflow")
+        )
+
+        id = Column(Integer, primary_key=True)
+        nome = Column(String, nullable=False)
+        email = Column(String, nullable=False)
+        data_registo = Column(Date, nullable=False)
+        distrito = Column(String, nullable=False)
+        version_timestamp = Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),  # auto-fill with current timestamp on insert
+        )
+
+        transacoes = relationship(
+            "Transacao", back_populates="cliente", cascade="all, delete-orphan"
+        )
+
+    class Produto(Base):
+        """Table for products"""
+
+        __tablename__ = "produtos"
+        __table_args__ = ({"schema": schema},)
+
+        id = Column(Integer, primary_key=True)
+        nome = Column(String, nullable=False)
+        categoria = Column(String, nullable=False)
+        preco = Column(Numeric(10, 2), nullable=False)
+        fornecedor = Column(String, nullable=False)
+        version_timestamp = Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),  # auto-fill with current timestamp on insert
+        )
+
+        itens_transacao = relationship(
+            "TransacaoItem", back_populates="produto", cascade="all, delete-orphan"
+        )
+
+    class Transacao(Base):
+        """Table for transactions (main order table)"""
+
+        __tablename__ = "transacoes"
+        __table_args__ = ({"schema": schema},)
+
+        id = Column(Integer, primary_key=True)
+        id_cliente = Column(
+            Integer,
+            ForeignKey(
+                f"{schema}.clientes.id",
+                ondelete="CASCADE",
+                deferrable=True,
+                initially="DEFERRED",
+            ),
+            nullable=False,
+        )
+        data_hora = Column(DateTime, nullable=False)
+        metodo_pagamento = Column(String, nullable=False)
+        version_timestamp = Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),  # auto-fill with current timestamp on insert
+        )
+
+        cliente = relationship("Cliente", back_populates="transacoes")
+        itens = relationship(
+            "TransacaoItem", back_populates="transacao", cascade="all, delete-orphan"
+        )
+
+    class TransacaoItem(Base):
+        """Table for transaction items (each product per transaction)"""
+
+        __tablename__ = "transacao_itens"
+        __table_args__ = ({"schema": schema},)
+
+        id = Column(Integer, primary_key=True)
+        id_transacao = Column(
+            Integer,
+            ForeignKey(
+                f"{schema}.transacoes.id",
+                ondelete="CASCADE",
+                deferrable=True,
+                initially="DEFERRED",
+            ),
+            nullable=False,
+        )
+        id_produto = Column(
+            Integer,
+            ForeignKey(
+                f"{schema}.produtos.id",
+                ondelete="CASCADE",
+                deferrable=True,
+                initially="DEFERRED",
+            ),
+            nullable=False,
+        )
+        quantidade = Column(Integer, nullable=False)
+        preco_unitario = Column(Numeric(10, 2), nullable=False)
+        version_timestamp = Column(
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),  # auto-fill with current timestamp on insert
+        )
+
+        transacao = relationship("Transacao", back_populates="itens")
+        produto = relationship("Produto", back_populates="itens_transacao")
+
+    return {
+        "Cliente": Cliente,
+        "Produto": Produto,
+        "Transacao": Transacao,
+        "TransacaoItem": TransacaoItem,
+        "metadata": Base.metadata,
+    }
 
 
 # -----------------------
@@ -236,7 +276,7 @@ class TransacaoItem(Base):
 # -----------------------
 
 
-def get_engine(echo: bool = False):
+def get_engine(cfg, echo: bool = False):
     """
     Create SQLAlchemy engine using the connection string built from YAML config.
     """
@@ -244,7 +284,7 @@ def get_engine(echo: bool = False):
     db_url = build_db_url(cfg)
 
     # Mask password for safe logging
-    masked_url = db_url.replace(cfg["database"]["password"], "***")
+    masked_url = _mask_password(db_url)
 
     log.info(f"Connecting to database at: {masked_url}")
     return create_engine(db_url, echo=echo, pool_pre_ping=True, future=True)
@@ -259,32 +299,83 @@ def begin_conn(engine):
         yield conn
 
 
-def ensure_schema(engine):
+def ensure_schema(engine, schema: str):
     """
     Ensure the schema defined in the config exists.
     """
-    if SCHEMA.lower() != "public":
-        log.info(f"Ensuring schema '{SCHEMA}' exists…")
+    if schema.lower() != "public":
+        log.info(f"Ensuring schema '{schema}' exists…")
         with begin_conn(engine) as conn:
-            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}"))
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
     else:
         log.info("Using default schema 'public'.")
 
 
-def drop_tables(engine):
+def drop_tables(engine, metadata):
     """
     Drop all tables if the --recreate flag is used.
     """
     log.warning("Dropping tables (clientes, produtos, transacoes, transacao_itens)…")
-    Base.metadata.drop_all(engine, checkfirst=True)
+    with begin_conn(engine) as conn:
+        metadata.drop_all(conn, checkfirst=True)
 
 
-def create_tables(engine):
+def create_tables(engine, metadata):
     """
     Create all tables if they don't exist yet.
+    All CREATE TABLE statements run on one connection in a single
+    transaction (PostgreSQL DDL is transactional) instead of committing one by one.
     """
     log.info("Creating tables (clientes, produtos, transacoes, transacao_itens)…")
-    Base.metadata.create_all(engine, checkfirst=True)
+    with begin_conn(engine) as conn:
+        metadata.create_all(conn, checkfirst=True)
+
+
+def make_foreign_keys_deferrable(engine, schema: str):
+    """
+    Migrate FKs created before they were declared DEFERRABLE INITIALLY DEFERRED
+    (create_all never alters existing tables). Deferred FKs are checked once at
+    COMMIT, so load_to_db needs no session_replication_role switch.
+    """
+    with begin_conn(engine) as conn:
+        rows = conn.execute(
+            text(
+                """
+            SELECT c.conrelid::regclass::text, c.conname
+            FROM pg_constraint c
+            JOIN pg_namespace n ON n.oid = c.connamespace
+            WHERE c.contype = 'f' AND n.nspname = :schema
+              AND NOT (c.condeferrable AND c.condeferred)
+            """
+            ),
+            {"schema": schema},
+        ).all()
+        if rows:  # All ALTERs in one round trip
+            conn.exec_driver_sql(
+                "; ".join(
+                    f"ALTER TABLE {table} ALTER CONSTRAINT {name} "
+                    "DEFERRABLE INITIALLY DEFERRED"
+                    for table, name in rows
+                )
+            )
+    log.info(f"Foreign keys deferrable ({len(rows)} migrated).")
+
+
+def create_indexes_concurrently(engine, schema: str):
+    """
+    Create the secondary indexes with CREATE INDEX CONCURRENTLY IF NOT EXISTS, so
+    re-running the setup on a live schema doesn't take write-blocking locks.
+    CONCURRENTLY can't run inside a transaction, hence the AUTOCOMMIT connection.
+    """
+    log.info("Ensuring secondary indexes (CONCURRENTLY)…")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, table, column in SECONDARY_INDEXES:
+            index_name = name.format(schema=schema)
+            conn.exec_driver_sql(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                f"ON {schema}.{table} ({column})"
+            )
+            log.info(f"Index {index_name} ready.")
 
 
 # -----------------------
@@ -303,23 +394,36 @@ def create_views_from_file(engine, sql_file_path="sql/data_analytics.sql"):
     with open(sql_file_path, "r", encoding="utf-8") as f:
         raw_sql = f.read()
 
-    # Remove comments and blank lines
-    clean_sql = [
-        line for line in raw_sql.splitlines() if not line.strip().startswith("--")
-    ]
-    sql_content = "\n".join(clean_sql)
+    # Remove comment lines in one C-level pass (no per-line Python work)
+    sql_content = _SQL_COMMENT.sub("", raw_sql)
 
     # Split into multiple statements by semicolon
-    queries = [q.strip() for q in sql_content.split(";") if q.strip()]
+    queries = [s for s in (q.strip() for q in sql_content.split(";")) if s]
 
-    # Execute each query sequentially
+    # Execute the queries in batches (one round trip per batch). Each batch runs in a
+    # SAVEPOINT; if it fails, only that batch is retried statement by statement so a
+    # single bad block is still logged and skipped, as before.
     with begin_conn(engine) as conn:
-        for i, query in enumerate(queries, 1):
+        for start in range(0, len(queries), SQL_BATCH_SIZE):
+            batch = queries[start : start + SQL_BATCH_SIZE]
             try:
-                conn.execute(text(query))
-                log.info(f"Executed SQL block {i}")
+                with conn.begin_nested():
+                    conn.exec_driver_sql(";\n".join(batch) + ";")
+                log.info(f"Executed SQL blocks {start + 1}-{start + len(batch)}")
+                continue
             except Exception as e:
-                log.error(f"Failed to execute SQL block {i}: {e}")
+                log.warning(
+                    f"SQL batch {start + 1}-{start + len(batch)} failed ({e}); "
+                    "retrying one block at a time…"
+                )
+
+            for i, query in enumerate(batch, start + 1):
+                try:
+                    with conn.begin_nested():
+                        conn.exec_driver_sql(query)
+                    log.info(f"Executed SQL block {i}")
+                except Exception as e:
+                    log.error(f"Failed to execute SQL block {i}: {e}")
 
     log.info("✅ All analytics queries executed successfully.")
 
@@ -359,19 +463,33 @@ def main():
     - Ensures database exists (RDS) and creates engine
     - Ensures schema
     - Creates/drops tables
+    - Makes foreign keys deferrable (older schemas)
+    - Creates secondary indexes (CONCURRENTLY)
     - Creates views
     """
     args = parse_args()
+
+    # Load the YAML configuration (dev.yaml or prod.yaml, picked by ENV=dev|prod)
+    cfg = get_config()
+    logging.basicConfig(
+        level=cfg["log_level"],  # Uses "DEBUG" or "INFO" from YAML
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    schema = cfg["db_schema"]
+    models = build_models(schema)
+
     try:
         # cria DB se não existir (ex.: em RDS acabada de criar)
         ensure_database_exists(cfg)
-        engine = get_engine(echo=args.echo)
-        ensure_schema(engine)
+        engine = get_engine(cfg, echo=args.echo)
+        ensure_schema(engine, schema)
 
         if args.recreate:
-            drop_tables(engine)
+            drop_tables(engine, models["metadata"])
 
-        create_tables(engine)
+        create_tables(engine, models["metadata"])
+        make_foreign_keys_deferrable(engine, schema)
+        create_indexes_concurrently(engine, schema)
         create_views_from_file(engine, args.sql_file)
 
         log.info("✅ Database setup complete.")
@@ -3,9 +3,12 @@
 S3 Integration — Raw CSV Uploader
 ---------------------------------
 - Uploads raw CSV files into S3 with partitioned paths:
-  s3://<bucket>/raw/year=YYYY/month=MM/day=DD/{customers|products|transactions}/<file_with_version>.csv
+  s3://<bucket>/raw/year=YYYY/month=MM/day=DD/{customers|products|transactions}/<file_with_version>.csv.gz
 - Implements simple file versioning by appending a UTC timestamp to the filename.
 - Adds basic exponential backoff retry logic.
+- CSVs are gzipped before upload (.csv.gz, Content-Encoding: gzip) to cut bytes on the wire.
+- Keeps a stable raw/latest/<entity>/<stem>.csv.gz copy; unchanged files are not re-uploaded
+  (the day's versioned key is created with a server-side copy instead).
 
 Run:
     python src/cloud/s3_handler.py
@@ -16,12 +19,19 @@ You should only need to change S3_BUCKET once below.
 import os
 import sys
 import time
+import gzip
+import hashlib
+import shutil
+import tempfile
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, date
 from pathlib import Path
 from typing import Dict, Optional
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
 from config.config_loader import get_config
 
@@ -46,6 +56,7 @@ log.info(f"Running in ENV={cfg['environment']} | bucket={S3_BUCKET}")
 # -----------------------
 LOCAL_DIR = Path("data/raw")
 BASE_PREFIX = "raw"
+LATEST_PREFIX = f"{BASE_PREFIX}/latest"
 RAW_FILE_MAP: Dict[str, str] = {
     "clientes.csv": "customers",
     "produtos.csv": "products",
@@ -54,16 +65,40 @@ RAW_FILE_MAP: Dict[str, str] = {
 
 MAX_RETRIES = 5
 INITIAL_BACKOFF_SECS = 1.0
+MAX_UPLOAD_WORKERS = 8  # Upper bound for concurrent file uploads
+GZIP_LEVEL = 6  # zlib default: good ratio on text CSVs at low CPU cost
+
+# Multipart uploads with threaded parts for files above 8 MB (16 MB parts, 8 in flight)
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True,
+)
+
+# One HTTP connection per in-flight part of every concurrent file upload (the
+# default pool of 10 would make the part threads queue for a connection)
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_UPLOAD_WORKERS * TRANSFER_CONFIG.max_request_concurrency
+)
+
+
+_S3_CLIENT = None  # Shared client, built on first use by _s3_client()
 
 
 def _s3_client() -> boto3.client:
     """
-    Create an S3 client using the default AWS credential/region chain:
+    Return the shared S3 client, creating it on first use with the default AWS
+    credential/region chain:
     - ~/.aws/credentials or AWS SSO/profile you’ve already configured
     - EC2/ECS role, etc.
-    No env vars needed at runtime.
+    No env vars needed at runtime. Building a client (endpoint + service model
+    loading, credential resolution) is expensive, so it happens once per process.
     """
-    return boto3.client("s3")
+    global _S3_CLIENT
+    if _S3_CLIENT is None:
+        _S3_CLIENT = boto3.session.Session().client("s3", config=CLIENT_CONFIG)
+    return _S3_CLIENT
 
 
 def _utc_version_tag() -> str:
@@ -77,6 +112,49 @@ def _partition_path(run_date: Optional[date] = None) -> str:
     return f"{BASE_PREFIX}/year={d.year:04d}/month={d.month:02d}/day={d.day:02d}"
 
 
+def _gzip_to_tempfile(src: Path) -> Path:
+    """
+    Compress a local file into a temporary .gz file and return its path.
+    mtime=0 keeps the output byte-identical for identical input (stable MD5/ETag).
+    """
+    fd, tmp_name = tempfile.mkstemp(suffix=".csv.gz")
+    with os.fdopen(fd, "wb") as raw_out, open(src, "rb") as f_in:
+        with gzip.GzipFile(
+            filename=src.name,
+            mode="wb",
+            compresslevel=GZIP_LEVEL,
+            fileobj=raw_out,
+            mtime=0,
+        ) as f_out:
+            shutil.copyfileobj(f_in, f_out, length=1 << 20)
+    return Path(tmp_name)
+
+
+def _md5_hex(path: Path) -> str:
+    """MD5 of a file, streamed in 1 MiB chunks."""
+    h = hashlib.md5(usedforsecurity=False)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _is_unchanged(s3, bucket: str, key: str, md5_hex: str, size: int) -> bool:
+    """
+    True if s3://bucket/key already holds this exact content (HEAD only, no download).
+    Compares our stored content_md5 metadata (ETag is not an MD5 for multipart/KMS
+    objects) and falls back to the ETag; the size must match too.
+    """
+    try:
+        head = s3.head_object(Bucket=bucket, Key=key)
+    except ClientError:
+        return False  # 404 (no latest copy yet) or no access: just upload
+    if head.get("ContentLength") != size:
+        return False
+    stored = head.get("Metadata", {}).get("content_md5") or head["ETag"].strip('"')
+    return stored == md5_hex
+
+
 def _upload_with_retries(
     s3,
     file_path: Path,
@@ -96,6 +174,7 @@ def _upload_with_retries(
                 Bucket=bucket,
                 Key=key,
                 ExtraArgs=extra_args,
+                Config=TRANSFER_CONFIG,
             )
             return
         except (BotoCoreError, ClientError) as e:
@@ -113,7 +192,7 @@ def _upload_with_retries(
 def upload_raw_csvs(bucket: str, run_date: Optional[date] = None) -> None:
     """
     Upload raw CSVs to:
-      raw/year=YYYY/month=MM/day=DD/<entity>/<original_stem>_<UTCVER>.csv
+      raw/year=YYYY/month=MM/day=DD/<entity>/<original_stem>_<UTCVER>.csv.gz
     where <entity> in {customers, products, transactions}
     """
     if not bucket or bucket == "YOUR_S3_BUCKET_NAME_HERE":
@@ -125,25 +204,64 @@ def upload_raw_csvs(bucket: str, run_date: Optional[date] = None) -> None:
     version = _utc_version_tag()
     s3 = _s3_client()
 
+    # Build every upload first (fail fast on a missing file before anything is sent)
+    tasks = []
     for local_name, entity in RAW_FILE_MAP.items():
         src = LOCAL_DIR / local_name
         if not src.exists():
             raise FileNotFoundError(f"Missing local file: {src}")
 
-        versioned_name = f"{src.stem}_{version}.csv"
+        versioned_name = f"{src.stem}_{version}.csv.gz"
         key = f"{partition}/{entity}/{versioned_name}"
 
         extra_args = {
             "ContentType": "text/csv",
+            "ContentEncoding": "gzip",
             "Metadata": {
                 "source": "shopflow-data-generator",
                 "version_tag": version,
                 "entity": entity,
             },
         }
+        latest_key = f"{LATEST_PREFIX}/{entity}/{src.stem}.csv.gz"
+        tasks.append((src, key, latest_key, extra_args))
+
+    def _upload(task):
+        src, key, latest_key, extra_args = task
+        gz_path = _gzip_to_tempfile(src)
+        try:
+            md5_hex = _md5_hex(gz_path)
+            extra_args["Metadata"]["content_md5"] = md5_hex
+            if _is_unchanged(s3, bucket, latest_key, md5_hex, gz_path.stat().st_size):
+                # Same bytes as the last upload: server-side copy, nothing re-sent.
+                # REPLACE writes this run's headers/metadata (version_tag) instead
+                # of carrying over the ones of the run that uploaded the bytes
+                log.info(
+                    f"Unchanged {src} → copying s3://{bucket}/{latest_key} to {key}"
+                )
+                s3.copy_object(
+                    Bucket=bucket,
+                    Key=key,
+                    CopySource={"Bucket": bucket, "Key": latest_key},
+                    MetadataDirective="REPLACE",
+                    **extra_args,
+                )
+                return
+
+            log.info(f"Uploading {src} (gzip) → s3://{bucket}/{key}")
+            _upload_with_retries(s3, gz_path, bucket, key, extra_args=extra_args)
+            s3.copy_object(
+                Bucket=bucket,
+                Key=latest_key,
+                CopySource={"Bucket": bucket, "Key": key},
+            )  # Refresh the stable "latest" pointer
+        finally:
+            gz_path.unlink(missing_ok=True)
 
-        log.info(f"Uploading {src} → s3://{bucket}/{key}")
-        _upload_with_retries(s3, src, bucket, key, extra_args=extra_args)
+    # Uploads are I/O-bound (boto3 releases the GIL on sockets) and the client is
+    # thread-safe, so the files go up concurrently; list() re-raises any failure.
+    with ThreadPoolExecutor(max_workers=min(MAX_UPLOAD_WORKERS, len(tasks))) as ex:
+        list(ex.map(_upload, tasks))
 
     log.info("✅ All raw CSVs uploaded to S3.")
 
@@ -1,20 +1,65 @@
 import csv
 import os
-import random
-from datetime import datetime, timedelta
+from datetime import datetime
+from itertools import chain, islice
 import sys
 
+import numpy as np
+
+CSV_BUFFER_SIZE = 1 << 20  # Write buffer for generated CSV files (default is 8 KiB)
+CSV_CHUNK_ROWS = 10_000  # Rows formatted per str.join block (bounds peak memory)
+
 # === Funções auxiliares ===
 
 
-def save_csv(filename, data, headers):
-    """Guarda uma lista de dicionários num ficheiro CSV com tratamento de erros."""
+def _join_csv(rows, n_fields):
+    """
+    Constrói um bloco de linhas CSV com str.join (mesmo formato do csv.writer,
+    linhas terminadas em CRLF). Devolve None se algum campo precisar de aspas
+    (vírgula, aspas ou quebra de linha) — nesse caso usa-se o módulo csv.
+    """
+    blob = "\r\n".join([",".join(map(str, r)) for r in rows]) + "\r\n"
+    n = len(rows)
+    # Cheap whole-block checks (C-level str.count) instead of inspecting each field
+    if (
+        blob.count(",") != (n_fields - 1) * n
+        or blob.count("\n") != n
+        or blob.count("\r") != n
+        or '"' in blob
+    ):
+        return None
+    return blob
+
+
+def _chunks(iterable, size):
+    """Parte um iterável em listas de até `size` elementos (sem materializar tudo)."""
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def save_csv(filename, columns):
+    """
+    Guarda um dicionário {coluna: lista de valores} num ficheiro CSV com
+    tratamento de erros (cabeçalho = chaves, pela ordem de inserção).
+    As linhas são geradas e escritas por blocos de CSV_CHUNK_ROWS.
+    """
     try:
         os.makedirs(os.path.dirname(filename), exist_ok=True)
-        with open(filename, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writeheader()
-            writer.writerows(data)
+        # 1 MiB buffer: each generated file goes out in a handful of write() calls
+        with open(
+            filename, "w", newline="", encoding="utf-8", buffering=CSV_BUFFER_SIZE
+        ) as f:
+            hdrs = tuple(columns)
+            rows = zip(*columns.values())  # Lazy: row tuples built chunk by chunk
+            writer = csv.writer(f)
+            for chunk in _chunks(chain([hdrs], rows), CSV_CHUNK_ROWS):
+                blob = _join_csv(chunk, len(hdrs))
+                if blob is not None:
+                    f.write(blob)  # Fast path: block built with str.join, one write
+                else:
+                    # Fields that need quoting: let csv.writer handle escaping
+                    writer.writerows(chunk)
         print(f"[OK] Ficheiro guardado: {filename}")
     except PermissionError:
         print(f"[ERRO] Sem permissões para escrever em {filename}")
@@ -104,94 +149,101 @@ def generate_data():
             "PayPal",
         ]
 
+        # Vectorized sampling: one NumPy call per column instead of one
+        # random.* call per row (PCG64 generator, not used for security)
+        rng = np.random.default_rng()
+        now = datetime.now()  # One clock read; all dates are relative to it
+        # NumPy bases for vectorized date math (ISO strings come out of astype(str))
+        today = np.datetime64(now.date(), "D")
+        now_s = np.datetime64(now.replace(microsecond=0), "s")
+
+        # Records are kept column-wise (one list per CSV column) instead of one
+        # dict per row; save_csv zips the columns straight into CSV lines.
+
         # --- Gerar clientes ---
-        customers = []
-        for i in range(1, 1001):
-            name = f"{random.choice(first_names)} {random.choice(last_names)}"  # nosec B311
+        n_customers = 1000
+        customer_ids = list(range(1, n_customers + 1))
+        first_idx = rng.integers(0, len(first_names), n_customers).tolist()
+        last_idx = rng.integers(0, len(last_names), n_customers).tolist()
+        names = [
+            f"{first_names[a]} {last_names[b]}" for a, b in zip(first_idx, last_idx)
+        ]
+        reg_days = rng.integers(0, 1000, n_customers, endpoint=True)
+        customers = {
+            "id": customer_ids,
+            "nome": names,
             # 👇 Garante emails únicos ao incluir o ID
-            email = name.lower().replace(" ", ".") + f".{i}@exemplo.pt"
-            registration_date = (
-                datetime.now() - timedelta(days=random.randint(0, 1000))  # nosec B311
-            ).strftime("%Y-%m-%d")
-            district = random.choice(districts)  # nosec B311
-            customers.append(
-                {
-                    "id": i,
-                    "nome": name,
-                    "email": email,
-                    "data_registo": registration_date,
-                    "distrito": district,
-                }
-            )
+            "email": [
+                name.lower().replace(" ", ".") + f".{i}@exemplo.pt"
+                for i, name in zip(customer_ids, names)
+            ],
+            "data_registo": (today - reg_days.astype("timedelta64[D]"))
+            .astype(str)
+            .tolist(),
+            "distrito": [
+                districts[k]
+                for k in rng.integers(0, len(districts), n_customers).tolist()
+            ],
+        }
 
         # --- Gerar produtos ---
-        products = []
-        for i in range(1, 501):
-            category = random.choice(categories)  # nosec B311
-            name = f"{category} {i}"
-            price = round(random.uniform(5, 500), 2)  # nosec B311
-            supplier = random.choice(suppliers)  # nosec B311
-            products.append(
-                {
-                    "id": i,
-                    "nome": name,
-                    "categoria": category,
-                    "preco": price,
-                    "fornecedor": supplier,
-                }
-            )
+        n_products = 500
+        product_ids = list(range(1, n_products + 1))
+        product_categories = [
+            categories[c] for c in rng.integers(0, len(categories), n_products).tolist()
+        ]
+        product_prices = rng.uniform(5, 500, n_products).round(2)  # index = id - 1
+        products = {
+            "id": product_ids,
+            "nome": [f"{c} {i}" for i, c in zip(product_ids, product_categories)],
+            "categoria": product_categories,
+            "preco": product_prices.tolist(),
+            "fornecedor": [
+                suppliers[f]
+                for f in rng.integers(0, len(suppliers), n_products).tolist()
+            ],
+        }
 
         # --- Gerar transações ---
-        transactions = []
-        transaction_items = []  # 🔹 new table data
-
-        for i in range(1, 5001):
-            customer_id = random.randint(1, 1000)  # nosec B311
-            product_id = random.randint(1, 500)  # nosec B311
-            quantity = random.randint(1, 5)  # nosec B311
-            timestamp = (
-                datetime.now() - timedelta(days=random.randint(0, 365))  # nosec B311
-            ).strftime("%Y-%m-%d %H:%M:%S")
-            payment_method = random.choice(payment_methods)  # nosec B311
-
-            # find product price
-            product_price = next(
-                (p["preco"] for p in products if p["id"] == product_id), 0
-            )
-
-            transactions.append(
-                {
-                    "id": i,
-                    "id_cliente": customer_id,
-                    "id_produto": product_id,
-                    "quantidade": quantity,
-                    "data_hora": timestamp,
-                    "metodo_pagamento": payment_method,
-                }
-            )
-
-            # 🔹 create normalized transaction item
-            transaction_items.append(
-                {
-                    "id": i,  # same ID for simplicity (1-to-1 in this generator)
-                    "id_transacao": i,
-                    "id_produto": product_id,
-                    "quantidade": quantity,
-                    "preco_unitario": product_price,
-                }
-            )
+        n_transactions = 5000
+        transaction_ids = list(range(1, n_transactions + 1))
+        tx_products = rng.integers(1, n_products, n_transactions, endpoint=True)
+        tx_quantities = rng.integers(1, 5, n_transactions, endpoint=True).tolist()
+        tx_days = rng.integers(0, 365, n_transactions, endpoint=True)
+        transactions = {
+            "id": transaction_ids,
+            "id_cliente": rng.integers(
+                1, n_customers, n_transactions, endpoint=True
+            ).tolist(),
+            "id_produto": tx_products.tolist(),
+            "quantidade": tx_quantities,
+            # "YYYY-MM-DDTHH:MM:SS" -> "YYYY-MM-DD HH:MM:SS" in one vectorized pass
+            "data_hora": np.char.replace(
+                (now_s - tx_days.astype("timedelta64[D]")).astype(str), "T", " "
+            ).tolist(),
+            "metodo_pagamento": [
+                payment_methods[m]
+                for m in rng.integers(0, len(payment_methods), n_transactions).tolist()
+            ],
+        }
+
+        # 🔹 normalized transaction items (1-to-1 with transactions in this generator):
+        # the shared columns are reused as-is, unit prices come from one fancy index
+        transaction_items = {
+            "id": transaction_ids,  # same ID for simplicity
+            "id_transacao": transaction_ids,
+            "id_produto": transactions["id_produto"],
+            "quantidade": tx_quantities,
+            "preco_unitario": product_prices[tx_products - 1].tolist(),
+        }
 
         # --- Guardar ficheiros ---
-        save_csv("data/raw/clientes.csv", customers, customers[0].keys())
-        save_csv("data/raw/produtos.csv", products, products[0].keys())
-        save_csv("data/raw/transacoes.csv", transactions, transactions[0].keys())
+        save_csv("data/raw/clientes.csv", customers)
+        save_csv("data/raw/produtos.csv", products)
+        save_csv("data/raw/transacoes.csv", transactions)
 
         # 🔹 NEW: save normalized transaction items
-        save_csv(
-            "data/raw/transacao_itens.csv",
-            transaction_items,
-            transaction_items[0].keys(),
-        )
+        save_csv("data/raw/transacao_itens.csv", transaction_items)
 
         print("✅ Dados portugueses gerados com sucesso!")
 
@@ -1,8 +1,11 @@
 import csv
 import os
 import re
+import warnings
 from datetime import datetime
 
+import pandas as pd
+
 # --- Paths ---
 data_dir = "data/raw"
 log_dir = "logs"
@@ -13,115 +16,274 @@ os.makedirs(log_dir, exist_ok=True)
 
 # --- Helper functions for validation ---
 
+# Compiled once at import (no per-call lookup in the re module's cache);
+# always applied with fullmatch, so no ^/$ anchors (and no trailing-newline match)
+_EMAIL_RE = re.compile(r"[\w\.-]+@[\w\.-]+\.\w+")
+
 
 def is_valid_email(email):
     """Check if an email address has a basic valid format."""
-    pattern = r"^[\w\.-]+@[\w\.-]+\.\w+$"
-    return re.match(pattern, email) is not None
+    return _EMAIL_RE.fullmatch(email) is not None
+
+
+# The field patterns strptime uses for "%Y-%m-%d" and "%Y-%m-%d %H:%M:%S":
+# one-digit month/day/time fields are fine, and the space in the format
+# matches any run of whitespace. The calendar check is left to datetime().
+_DATE_RE = re.compile(
+    r"(\d{4})-(1[0-2]|0[1-9]|[1-9])-(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])"
+    r"(?:\s+(2[0-3]|[01]\d|\d):([0-5]\d|\d):(6[01]|[0-5]\d|\d))?"
+)
 
 
 def is_valid_date(date_str):
-    """Try to parse a date to see if it's in a valid format."""
-    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S"):
+    """
+    Check for a YYYY-MM-DD date or a YYYY-MM-DD HH:MM:SS timestamp, accepting
+    exactly what datetime.strptime accepts for those two formats (one regex
+    match and one datetime() call instead of up to two strptime attempts).
+    """
+    m = _DATE_RE.fullmatch(date_str)
+    if m is None:
+        return False
+    try:
+        datetime(*[int(g) for g in m.groups() if g is not None])
+        return True
+    except ValueError:  # Day not in month, year 0, second 60/61
+        return False
+
+
+# --- Column-wise (vectorized) versions of the helpers ---
+
+# Zero-padded ASCII YYYY-MM-DD[ HH:MM:SS]: the shape the column path parses in bulk
+_DATE_CANONICAL = r"[0-9]{4}-[0-9]{2}-[0-9]{2}( [0-9]{2}:[0-9]{2}:[0-9]{2})?"
+_INT_RE = r"\s*[+-]?\d+\s*"  # Plain ASCII integers; anything else goes to int()
+
+
+def _valid_emails(values):
+    """
+    Boolean Series: True where is_valid_email(value) is True.
+    Arrow's regex kernel does the bulk of the work, but its \\w is ASCII-only
+    (RE2); the rows it rejects are re-checked with Python's re, so names like
+    'joão.silva@...' keep is_valid_email's answer.
+    """
+    valid = values.str.fullmatch(_EMAIL_RE.pattern)
+    retry = ~valid
+    if retry.any():
+        valid[retry] = values[retry].map(is_valid_email)
+    return valid
+
+
+def _valid_dates(values):
+    """
+    Boolean Series: True where is_valid_date(value) is True.
+    Canonical (zero-padded) values are parsed in bulk by to_datetime; every
+    other value, and any the bulk parse rejects (e.g. out of its year range),
+    gets the exact per-value check, so the result always matches the helper.
+    """
+    # to_datetime also takes year 0000 and leap seconds (:60/:61); strptime does not
+    canonical = (
+        values.str.fullmatch(_DATE_CANONICAL)
+        & ~values.str.startswith("0000")
+        & (values.str.slice(17, 19) < "60")
+    )
+    date_only = pd.to_datetime(
+        values.where(canonical & (values.str.len() == 10)),
+        format="%Y-%m-%d",
+        errors="coerce",
+    )
+    with_time = pd.to_datetime(
+        values.where(canonical & (values.str.len() == 19)),
+        format="%Y-%m-%d %H:%M:%S",
+        errors="coerce",
+    )
+    valid = date_only.notna() | with_time.notna()
+    retry = ~valid
+    if retry.any():
+        valid[retry] = values[retry].map(is_valid_date)
+    return valid
+
+
+def _reparse(values, parsed, invalid, parse):
+    """Retry the flagged values with parse() itself ('1_000', non-ASCII digits, 'nan')."""
+    for i in invalid.to_numpy().nonzero()[0].tolist():
         try:
-            datetime.strptime(date_str, fmt)
-            return True
+            parsed.iat[i] = parse(values.iat[i])
         except ValueError:
             continue
-    return False
+        invalid.iat[i] = False
+    return parsed, invalid
+
+
+def _parse_floats(values):
+    """(floats, invalid) like float() per value: invalid marks unparseable text."""
+    floats = pd.to_numeric(values, errors="coerce").astype("float64")
+    return _reparse(values, floats, floats.isna(), float)
+
+
+def _parse_ints(values):
+    """(ints as floats, invalid) like int() per value."""
+    is_int = values.str.fullmatch(_INT_RE)
+    ints = pd.to_numeric(values.where(is_int), errors="coerce").astype("float64")
+    return _reparse(values, ints, ~is_int, int)
+
+
+# --- Per-file checks ---
+# Each one gets col(name, default) -> text Series and
+# report(order, mask, describe) -> queue one message per flagged row.
+
+
+def _check_clientes(col, report):
+    email = col("email", "")
+    registo = col("data_registo", "")
+    report(0, ~_valid_emails(email), lambda i: f"Invalid email '{email.iat[i]}'")
+    report(1, ~_valid_dates(registo), lambda i: f"Invalid date '{registo.iat[i]}'")
+
 
+def _check_produtos(col, report):
+    raw = col("preco", "nan")
+    price, bad = _parse_floats(raw)
+    report(0, bad, lambda i: f"Invalid price '{raw.iat[i]}'")
+    report(1, price <= 0, lambda i: f"Non-positive price '{price.iat[i]}'")
 
-def log(message):
-    """Append a message to the log file."""
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(message + "\n")
+
+def _check_transacoes(col, report):
+    data_hora = col("data_hora", "")
+    report(
+        0, ~_valid_dates(data_hora), lambda i: f"Invalid timestamp '{data_hora.iat[i]}'"
+    )
+
+
+def _check_transacao_itens(col, report):
+    # quantidade
+    raw_q = col("quantidade", "0")
+    q, bad_q = _parse_ints(raw_q)
+    report(0, bad_q, lambda i: f"Invalid quantity '{raw_q.iat[i]}'")
+    report(1, q <= 0, lambda i: f"Non-positive quantity '{int(q.iat[i])}'")
+    # preco_unitario
+    raw_pu = col("preco_unitario", "nan")
+    pu, bad_pu = _parse_floats(raw_pu)
+    report(2, bad_pu, lambda i: f"Invalid unit price '{raw_pu.iat[i]}'")
+    report(3, pu <= 0, lambda i: f"Non-positive unit price '{pu.iat[i]}'")
+
+
+# File name -> checks (also the list of files main() validates, in order)
+VALIDATORS = {
+    "clientes.csv": _check_clientes,
+    "produtos.csv": _check_produtos,
+    "transacoes.csv": _check_transacoes,
+    "transacao_itens.csv": _check_transacao_itens,
+}
+
+
+def _read_ragged(file_path):
+    """
+    csv.reader fallback for files the pandas parser rejects (rows longer than
+    the header): returns (DataFrame cut/padded to the header, {row: extra fields}).
+    """
+    with open(file_path, newline="", encoding="utf-8") as f:
+        rows = [row for row in csv.reader(f) if row]  # DictReader skips blank lines
+    if not rows:
+        return pd.DataFrame(dtype=str), {}
+    header, width = rows[0], len(rows[0])
+    extra = {
+        i + 1: len(row) - width for i, row in enumerate(rows[1:]) if len(row) > width
+    }
+    data = [row[:width] + [None] * (width - len(row)) for row in rows[1:]]
+    return pd.DataFrame(data, columns=header, dtype=str), extra
 
 
 # --- Main validation function ---
-def validate_csv(filename):
+def validate_csv(filename, out):
+    """
+    Validate one CSV, writing messages to `out` (the log file main() keeps open).
+    Checks run over whole columns with pandas; messages keep the row-by-row order.
+    """
+
+    def log(message):
+        # Buffered by the open file object: no open/close per message
+        out.write(message + "\n")
+
     file_path = os.path.join(data_dir, filename)
 
     if not os.path.exists(file_path):
         log(f"[ERROR] File not found: {filename}")
         return
 
-    with open(file_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        row_num = 1
-        for row in reader:
-            # Check for null/empty values
-            for field, value in row.items():
-                if value == "" or value is None:
-                    log(f"[{filename}] Row {row_num}: Null value in '{field}'")
-
-            # Specific file checks (Portuguese field names)
-            if filename == "clientes.csv":
-                if not is_valid_email(row.get("email", "")):
-                    log(
-                        f"[{filename}] Row {row_num}: Invalid email '{row.get('email')}'"
-                    )
-                if not is_valid_date(row.get("data_registo", "")):
-                    log(
-                        f"[{filename}] Row {row_num}: Invalid date '{row.get('data_registo')}'"
-                    )
-
-            elif filename == "produtos.csv":
-                try:
-                    price = float(row.get("preco", "nan"))
-                    if price <= 0:
-                        log(f"[{filename}] Row {row_num}: Non-positive price '{price}'")
-                except ValueError:
-                    log(
-                        f"[{filename}] Row {row_num}: Invalid price '{row.get('preco')}'"
-                    )
-
-            elif filename == "transacoes.csv":
-                if not is_valid_date(row.get("data_hora", "")):
-                    log(
-                        f"[{filename}] Row {row_num}: Invalid timestamp '{row.get('data_hora')}'"
-                    )
-
-            elif filename == "transacao_itens.csv":
-                # quantidade
-                try:
-                    q = int(row.get("quantidade", "0"))
-                    if q <= 0:
-                        log(f"[{filename}] Row {row_num}: Non-positive quantity '{q}'")
-                except ValueError:
-                    log(
-                        f"[{filename}] Row {row_num}: Invalid quantity '{row.get('quantidade')}'"
-                    )
-                # preco_unitario
-                try:
-                    pu = float(row.get("preco_unitario", "nan"))
-                    if pu <= 0:
-                        log(
-                            f"[{filename}] Row {row_num}: Non-positive unit price '{pu}'"
-                        )
-                except ValueError:
-                    log(
-                        f"[{filename}] Row {row_num}: Invalid unit price '{row.get('preco_unitario')}'"
-                    )
-
-            row_num += 1
+    extra = {}  # row -> number of fields beyond the header
+    try:
+        # All cells as text, empty cells as "", short rows padded with NaN.
+        # A row longer than the header is a ParserError (or, on the first data
+        # row, a ParserWarning before silently dropping the data), so those
+        # files go through csv.reader instead and are still checked row by row.
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", pd.errors.ParserWarning)
+            df = pd.read_csv(
+                file_path,
+                dtype=str,
+                keep_default_na=False,
+                index_col=False,
+                encoding="utf-8",
+            )
+    except (pd.errors.ParserError, pd.errors.ParserWarning, pd.errors.EmptyDataError):
+        try:
+            df, extra = _read_ragged(file_path)
+        except (csv.Error, UnicodeDecodeError) as e:
+            log(f"[ERROR] Could not parse {filename}: {e}")
+            return
+    except UnicodeDecodeError as e:
+        log(f"[ERROR] Could not parse {filename}: {e}")
+        return
+
+    issues = []  # (row_num, order, message), sorted below to keep per-row order
+
+    # Rows with more fields than the header (the extra fields are not checked)
+    for r, n in extra.items():
+        issues.append((r, -1, f"[{filename}] Row {r}: {n} extra field(s)"))
+
+    # Check for null/empty values (short rows give NaN, empty cells give "")
+    null_rows, null_cols = (df.isna() | df.eq("")).to_numpy().nonzero()
+    for r, c in zip(null_rows.tolist(), null_cols.tolist()):
+        issues.append(
+            (r + 1, c, f"[{filename}] Row {r + 1}: Null value in '{df.columns[c]}'")
+        )
+    df = df.fillna("")
+
+    def col(name, default):
+        """Column as text, or the row.get() default when the column is absent."""
+        return df[name] if name in df else pd.Series(default, index=df.index)
+
+    def report(order, mask, describe):
+        """Queue one message per row where mask is True (order = check position)."""
+        for i in mask.to_numpy().nonzero()[0].tolist():
+            issues.append(
+                (
+                    i + 1,
+                    len(df.columns) + order,
+                    f"[{filename}] Row {i + 1}: {describe(i)}",
+                )
+            )
+
+    # Specific file checks (Portuguese field names), picked once per file
+    check = VALIDATORS.get(filename)
+    if check is not None:
+        check(col, report)
+
+    for _, _, message in sorted(issues):
+        log(message)
 
     log(f"[OK] Finished validating {filename}")
 
 
 # --- Run all validations ---
 def main():
-    open(log_file, "w").close()  # Clear previous log
-    log("Starting data validation...\n")
-
-    for filename in [
-        "clientes.csv",
-        "produtos.csv",
-        "transacoes.csv",
-        "transacao_itens.csv",
-    ]:
-        validate_csv(filename)
-
-    log("\nValidation complete.")
+    # One open for the whole run ("w" also clears the previous log); the 1 MiB
+    # buffer batches the writes and whatever was validated survives a crash
+    with open(log_file, "w", encoding="utf-8", buffering=1 << 20) as out:
+        out.write("Starting data validation...\n\n")
+
+        for filename in VALIDATORS:
+            validate_csv(filename, out)
+
+        out.write("\nValidation complete.\n")
 
 
 if __name__ == "__main__":
@@ -17,10 +17,17 @@ sys.path.append(
 import json
 import logging
 from datetime import datetime, timedelta
-import pandas as pd
 
 # 🔁 NEW: import SQLAlchemy Core objects to build queries safely (no f-strings in SQL)
 from sqlalchemy import create_engine, text, MetaData, Table, select, bindparam
+from sqlalchemy import column, func
+from sqlalchemy import table as sql_table
+from sqlalchemy.dialects.postgresql import insert as pg_insert  # PostgreSQL UPSERT
+
+try:
+    from sqlalchemy.dialects.postgresql import distinct_on  # DISTINCT ON (2.1+)
+except ImportError:
+    distinct_on = None
 
 from config.config_loader import (
     get_config,
@@ -38,151 +45,156 @@ log = logging.getLogger(__name__)  # Module logger
 
 ENGINE = create_engine(build_db_url(cfg), future=True)  # DB engine for queries/loads
 SCHEMA = cfg["db_schema"]  # Source schema for transacoes
-CHECKPOINT_DIR = "checkpoints"  # Folder to store state
+CHECKPOINT_NAME = "transacoes"  # Row key in warehouse.etl_checkpoints
+CHECKPOINT_DIR = "checkpoints"  # Legacy checkpoint folder (read once, then the DB)
 CHECKPOINT_FILE = os.path.join(
     CHECKPOINT_DIR, "transacoes_checkpoint.json"
-)  # File for last processed time
+)  # Legacy file for last processed time
 LATE_WINDOW_DAYS = 2  # Overlap days to catch late-arriving events
+INCREMENT_COLUMNS = [
+    "id",
+    "id_cliente",
+    "data_hora",
+    "metodo_pagamento",
+    "version_timestamp",
+]  # Columns copied from transacoes into the DW fact
+
+_META = MetaData()  # Reflected source tables, cached for the process lifetime
+_REFLECTED = {}  # Table name -> reflected Table
 
 
-def _load_checkpoint() -> datetime:
+def _reflect(engine, name: str) -> Table:
     """
-    Load the last processed timestamp from checkpoint file.
-    If not found, default to epoch (process all).
+    Reflect SCHEMA.name once and reuse it (no pg_catalog round trips on later calls).
     """
-    os.makedirs(CHECKPOINT_DIR, exist_ok=True)  # Ensure checkpoint folder exists
-    if not os.path.exists(CHECKPOINT_FILE):  # If no checkpoint yet
-        return datetime(1970, 1, 1)  # Start from epoch
-    with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:  # Read JSON
-        data = json.load(f)  # Parse JSON
-    return datetime.fromisoformat(data["last_processed"])  # Return datetime object
+    if name not in _REFLECTED:  # First use: reflect columns from the DB
+        _REFLECTED[name] = Table(name, _META, schema=SCHEMA, autoload_with=engine)
+    return _REFLECTED[name]
 
 
-def _save_checkpoint(ts: datetime) -> None:
+def _ensure_warehouse(conn) -> None:
+    """
+    Create the warehouse schema, the incremental fact and the checkpoint table.
+    """
+    conn.execute(
+        text(
+            """
+        CREATE SCHEMA IF NOT EXISTS warehouse;
+        CREATE TABLE IF NOT EXISTS warehouse.fact_transactions_incremental (
+            id                INT PRIMARY KEY,
+            id_cliente        INT NOT NULL,
+            data_hora         TIMESTAMPTZ NOT NULL,
+            metodo_pagamento  TEXT NOT NULL,
+            version_timestamp TIMESTAMPTZ NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS warehouse.etl_checkpoints (
+            name            TEXT PRIMARY KEY,
+            last_processed  TIMESTAMPTZ NOT NULL
+        )
+    """
+        )
+    )  # One round trip for the three DDL statements
+
+
+def _load_checkpoint(conn) -> datetime:
+    """
+    Load the last processed timestamp from warehouse.etl_checkpoints on `conn`
+    (the caller's transaction, after _ensure_warehouse created the table).
+    If not found, fall back to the legacy JSON checkpoint file, then to epoch (process all).
+    """
+    last = conn.execute(
+        text("SELECT last_processed FROM warehouse.etl_checkpoints WHERE name = :n"),
+        {"n": CHECKPOINT_NAME},
+    ).scalar()
+    if last is not None:  # Stored as TIMESTAMPTZ; data_hora is naive
+        return last.replace(tzinfo=None)
+    if os.path.exists(CHECKPOINT_FILE):  # Checkpoint written by older versions
+        with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:  # Read JSON
+            data = json.load(f)  # Parse JSON
+        return datetime.fromisoformat(data["last_processed"])  # Return datetime object
+    return datetime(1970, 1, 1)  # Start from epoch
+
+
+def _save_checkpoint(conn, ts: datetime) -> None:
     """
-    Save the last processed timestamp to checkpoint file in ISO format.
+    Save the last processed timestamp on `conn`, inside the caller's transaction
+    (commits together with the DW upsert, so a crash can't split the two).
     """
-    with open(CHECKPOINT_FILE, "w", encoding="utf-8") as f:  # Open file for writing
-        json.dump({"last_processed": ts.isoformat()}, f)  # Write ISO timestamp
+    conn.execute(
+        text(
+            """
+        INSERT INTO warehouse.etl_checkpoints (name, last_processed)
+        VALUES (:n, :ts)
+        ON CONFLICT (name) DO UPDATE SET last_processed = EXCLUDED.last_processed
+    """
+        ),
+        {"n": CHECKPOINT_NAME, "ts": ts},
+    )  # Upsert the single checkpoint row
 
 
-def _fetch_increment(engine, since: datetime) -> pd.DataFrame:
+def _merge_increment(conn, since: datetime):
     """
-    Fetch only new/modified transacoes since (since - overlap window).
+    Merge new/modified transacoes since (since - overlap window) into the DW fact,
+    entirely on the server: one INSERT ... SELECT DISTINCT ON (id) ... ON CONFLICT.
     Overlap window handles late-arriving data by re-reading a small recent period.
+    Returns (rows merged, max data_hora merged or None).
     """
     window_start = since - timedelta(days=LATE_WINDOW_DAYS)  # Compute overlap start
 
-    # 🔁 CHANGED: build a safe SQLAlchemy Select instead of an f-string.
-    # - MetaData() holds table definitions for reflection
-    # - Table('transacoes', ..., autoload_with=engine) reflects columns from DB
-    # - select(...) creates SELECT id, id_cliente, data_hora, metodo_pagamento, version_timestamp
+    # Built with SQLAlchemy Core instead of an f-string (Bandit B608 is satisfied):
+    # - _reflect() reflects 'transacoes' from the DB once and caches the Table
+    # - DISTINCT ON (id) ... ORDER BY id, version_timestamp DESC keeps the newest
+    #   version per id (the dedup runs in Postgres, no rows travel to Python)
     # - bindparam('window_start') creates a named parameter for the WHERE clause
-    # - No schema/table names are interpolated into a string; Bandit B608 is satisfied.
-    meta = MetaData()
-    transacoes = Table("transacoes", meta, schema=SCHEMA, autoload_with=engine)
-    stmt = (
-        select(
-            transacoes.c.id,
-            transacoes.c.id_cliente,
-            transacoes.c.data_hora,
-            transacoes.c.metodo_pagamento,
-            transacoes.c.version_timestamp,
-        )
+    transacoes = _reflect(conn, "transacoes")  # Cached after the first call
+    latest = (
+        select(*[transacoes.c[c] for c in INCREMENT_COLUMNS])
         .where(transacoes.c.data_hora >= bindparam("window_start"))
-        .order_by(transacoes.c.data_hora.asc())
+        .order_by(transacoes.c.id, transacoes.c.version_timestamp.desc())
     )
-
-    # pandas can execute a SQLAlchemy Select; pass the parameter safely
-    df = pd.read_sql(stmt, engine, params={"window_start": window_start})
-    return df  # Return increment batch
-
-
-def _merge_into_dw(engine, df: pd.DataFrame) -> None:
-    """
-    Example upsert into a warehouse incremental fact table:
-      - Deduplicate by id (latest version_timestamp wins)
-      - Replace matching ids (idempotent upsert).
-    """
-    if df.empty:  # If nothing to process
-        log.info("No incremental records to process.")  # Log and return
-        return
-
-    # Prepare target table in warehouse schema
-    with engine.begin() as conn:  # Transaction block
-        conn.execute(
-            text("CREATE SCHEMA IF NOT EXISTS warehouse")
-        )  # Ensure warehouse schema
-        conn.execute(
-            text(
-                """
-            CREATE TABLE IF NOT EXISTS warehouse.fact_transactions_incremental (
-                id                INT PRIMARY KEY,
-                id_cliente        INT NOT NULL,
-                data_hora         TIMESTAMPTZ NOT NULL,
-                metodo_pagamento  TEXT NOT NULL,
-                version_timestamp TIMESTAMPTZ NOT NULL
-            )
-        """
-            )
-        )  # Target incremental fact
-
-    # Deduplicate by id using the latest version_timestamp
-    df = df.sort_values(["id", "version_timestamp"]).drop_duplicates(
-        subset=["id"], keep="last"
-    )
-    # Keep the newest version per id
-
-    # Load increment to a temp table
-    with engine.begin() as conn:  # Transaction block for upsert
-        df.head(0).to_sql(
-            "_tmp_increment", conn, schema="warehouse", if_exists="replace", index=False
-        )  # Create temp
-        df.to_sql(
-            "_tmp_increment", conn, schema="warehouse", if_exists="append", index=False
-        )  # Fill temp
-
-        # Upsert using ON CONFLICT (id)
-        conn.execute(
-            text(
-                """
-            INSERT INTO warehouse.fact_transactions_incremental (id, id_cliente, data_hora, metodo_pagamento, version_timestamp)
-            SELECT id, id_cliente, data_hora, metodo_pagamento, version_timestamp
-            FROM warehouse._tmp_increment
-            ON CONFLICT (id) DO UPDATE
-              SET id_cliente = EXCLUDED.id_cliente,
-                  data_hora = EXCLUDED.data_hora,
-                  metodo_pagamento = EXCLUDED.metodo_pagamento,
-                  version_timestamp = EXCLUDED.version_timestamp
-        """
-            )
-        )  # Upsert new/updated rows
-        conn.execute(text("DROP TABLE warehouse._tmp_increment"))  # Clean up temp table
-
-    log.info(
-        f"Incremental upsert completed: {len(df)} rows processed."
-    )  # Log processed count
+    if distinct_on is not None:  # SQLAlchemy 2.1+
+        latest = latest.ext(distinct_on(transacoes.c.id))
+    else:  # SQLAlchemy 2.0 spelling
+        latest = latest.distinct(transacoes.c.id)
+
+    fact = sql_table(
+        "fact_transactions_incremental",
+        *[column(c) for c in INCREMENT_COLUMNS],
+        schema="warehouse",
+    )  # Target incremental fact (created by _ensure_warehouse)
+    insert_stmt = pg_insert(fact).from_select(INCREMENT_COLUMNS, latest)
+    upsert_stmt = insert_stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={c: insert_stmt.excluded[c] for c in INCREMENT_COLUMNS if c != "id"},
+    ).returning(fact.c.data_hora)
+
+    # Upsert as a data-modifying CTE: the same round trip returns count and max
+    merged = upsert_stmt.cte("merged")
+    summary = select(func.count(), func.max(merged.c.data_hora))
+    rows, max_data_hora = conn.execute(summary, {"window_start": window_start}).one()
+    return rows, max_data_hora
 
 
 def run():
     """
-    Main incremental workflow:
+    Main incremental workflow, in one transaction:
       1) Load checkpoint
-      2) Query only new/changed rows (with late-arrival overlap)
-      3) Merge into DW fact (idempotent upsert)
-      4) Advance checkpoint to max(data_hora) processed
+      2) Merge only new/changed rows (with late-arrival overlap) into the DW fact
+         (idempotent upsert, deduplicated by id on the server)
+      3) Advance checkpoint to max(data_hora) processed
     """
-    last = _load_checkpoint()  # Load last processed timestamp
-    log.info(f"Last checkpoint: {last.isoformat()}")  # Log checkpoint
-
-    incr = _fetch_increment(ENGINE, since=last)  # Fetch only recent/changed rows
-    _merge_into_dw(ENGINE, incr)  # Merge increment into DW table
-
-    if not incr.empty:  # If any rows processed
-        new_checkpoint = (
-            pd.to_datetime(incr["data_hora"]).max().to_pydatetime()
-        )  # Compute latest data_hora
-        _save_checkpoint(new_checkpoint)  # Save checkpoint forward
+    with ENGINE.begin() as conn:  # Upsert and checkpoint commit together
+        _ensure_warehouse(conn)  # Prepare target and checkpoint tables (once per run)
+        last = _load_checkpoint(conn)  # Load last processed timestamp
+        log.info(f"Last checkpoint: {last.isoformat()}")  # Log checkpoint
+        rows, new_checkpoint = _merge_increment(conn, since=last)
+        if rows:  # If any rows processed
+            _save_checkpoint(conn, new_checkpoint)  # Save checkpoint forward
+
+    if rows:
+        log.info(
+            f"Incremental upsert completed: {rows} rows processed."
+        )  # Log processed count
         log.info(
             f"Checkpoint advanced to: {new_checkpoint.isoformat()}"
         )  # Log advancement
@@ -9,10 +9,14 @@
 
 import os  # Used for paths
 import logging  # Used for logging
+import re  # Parses CHECK constraint definitions
+from concurrent.futures import ThreadPoolExecutor  # Concurrent check queries
 from datetime import datetime  # Used to timestamp reports
-from typing import Dict, List  # Type hints for clarity
-import pandas as pd  # Data manipulation for checks
-from sqlalchemy import create_engine  # To fetch data from DB for checks
+from functools import lru_cache  # Engine built once, on first use
+from typing import Dict, List, Optional, Set, Tuple  # Type hints for clarity
+from sqlalchemy import create_engine, text  # To run the checks in the DB
+from sqlalchemy import select, func, column, not_
+from sqlalchemy import table as sql_table
 import sys
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../.."))
@@ -31,46 +35,133 @@ REPORT_DIR = "logs"  # Place reports under logs/
 REPORT_PATH = os.path.join(
     REPORT_DIR, "quality_report.md"
 )  # Output markdown report path
-ENGINE = create_engine(
-    build_db_url(cfg), future=True
-)  # DB engine for reading tables to validate
 
 
-def _expect_not_null(df: pd.DataFrame, cols: List[str]) -> List[str]:
+@lru_cache(maxsize=1)
+def get_engine():
+    """
+    DB engine for the tables to validate, built on the first call: importing
+    the module (e.g. for the unit tests) creates no engine.
+    """
+    return create_engine(build_db_url(cfg), future=True, pool_pre_ping=True)
+
+
+# Each check is a named SQL predicate; _count_violations() turns a table's
+# checks into COUNT(*) FILTER (WHERE predicate) columns of one aggregate query,
+# so only the counts travel back (never the table rows).
+
+
+def _not_null_checks(t, cols: List[str]) -> Dict[str, object]:
+    """Predicates for 'column is NULL', keyed '<col>_nulls'."""
+    return {f"{c}_nulls": t.c[c].is_(None) for c in cols}
+
+
+def _positive_checks(t, cols: List[str]) -> Dict[str, object]:
+    """Predicates for 'column <= 0', keyed '<col>_non_positive'."""
+    return {f"{c}_non_positive": t.c[c] <= 0 for c in cols}
+
+
+def _email_checks(t, col: str) -> Dict[str, object]:
+    """Predicate for 'email has no @', keyed '<col>_invalid'."""
+    return {f"{col}_invalid": not_(t.c[col].contains("@"))}
+
+
+# Constraints that already prove a check for every stored row: NOT NULL, and
+# validated single-column CHECK (col > 0) (a NULL passes a CHECK, but NULLs are
+# not counted by the positivity predicate either)
+_NOT_NULL_SQL = text(
+    """
+    SELECT table_name, column_name FROM information_schema.columns
+    WHERE table_schema = :schema AND is_nullable = 'NO'
+    """
+)
+_CHECK_SQL = text(
+    """
+    SELECT c.relname, a.attname, pg_get_constraintdef(k.oid)
+    FROM pg_constraint k
+    JOIN pg_class c ON c.oid = k.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = k.conrelid AND a.attnum = k.conkey[1]
+    WHERE n.nspname = :schema AND k.contype = 'c' AND k.convalidated
+      AND cardinality(k.conkey) = 1
+    """
+)
+# e.g. CHECK ((quantidade > 0)) or CHECK ((preco > (0)::numeric))
+_POSITIVE_CHECK_RE = re.compile(
+    r'CHECK \(\(?"?(\w+)"?\s*>\s*\(?0(?:\.0*)?\)?(?:::[\w ]+)?\)?\)'
+)
+
+
+def _is_positive_check(definition: str, col: str) -> bool:
+    """True if a CHECK constraint definition is exactly 'col > 0'."""
+    m = _POSITIVE_CHECK_RE.fullmatch(definition)
+    return m is not None and m.group(1) == col
+
+
+def _proven_columns(conn, schema: str) -> Tuple[Set[tuple], Set[tuple]]:
+    """
+    (table, column) pairs whose constraints already guarantee 'not null' and
+    '> 0'; their checks can be skipped (one catalog round trip per run).
+    """
+    not_null = {tuple(r) for r in conn.execute(_NOT_NULL_SQL, {"schema": schema})}
+    positive = {
+        (tbl, col)
+        for tbl, col, definition in conn.execute(_CHECK_SQL, {"schema": schema})
+        if _is_positive_check(definition, col)
+    }
+    return not_null, positive
+
+
+def _violations_query(t, checks: Dict[str, object]):
+    """All checks of one table as a single aggregate SELECT (one count per check)."""
+    return select(
+        *[func.count().filter(cond).label(name) for name, cond in checks.items()]
+    ).select_from(t)
+
+
+def _count_violations(conn, t, checks: Dict[str, object]) -> Dict[str, int]:
+    """
+    Run all checks of one table as a single server-side aggregate query.
+    Returns {check name: number of offending rows}.
+    """
+    return dict(conn.execute(_violations_query(t, checks)).mappings().one())
+
+
+def _expect_not_null(counts: Dict[str, int], cols: List[str]) -> List[str]:
     """
     Expectation: specified columns must have no nulls.
     Returns list of error messages (empty if all good).
     """
     errs = []  # Collect any violations here
     for c in cols:  # Check each requested column
-        if df[c].isna().any():  # If any null found in column
+        # No count: the check was skipped because a constraint proves it
+        if counts.get(f"{c}_nulls"):  # If any null found in column
             errs.append(f"Nulls found in column '{c}'")  # Record violation message
     return errs  # Return list of errors (if any)
 
 
-def _expect_positive(df: pd.DataFrame, cols: List[str]) -> List[str]:
+def _expect_positive(counts: Dict[str, int], cols: List[str]) -> List[str]:
     """
     Expectation: numeric columns must be > 0.
     """
     errs = []  # Initialize error list
     for c in cols:
-        if (df[c] <= 0).any():  # If any non-positive value found
+        if counts.get(f"{c}_non_positive"):  # If any non-positive value found
             errs.append(f"Non-positive values in column '{c}'")  # Add message
     return errs  # Return violations
 
 
-def _expect_valid_email(df: pd.DataFrame, col: str) -> List[str]:
+def _expect_valid_email(counts: Dict[str, int], col: str) -> List[str]:
     """
     Expectation: email column must contain '@' (simple check adequate for exercise scope).
     """
     errs = []  # Errors collection
-    bad = ~df[col].astype(str).str.contains("@")  # Rows without '@'
-    if bad.any():  # If any invalid emails present
+    if counts[f"{col}_invalid"]:  # If any invalid emails present
         errs.append(f"Invalid email addresses in '{col}'")  # Add message
     return errs  # Return list (possibly empty)
 
 
-def run_quality_checks() -> None:
+def run_quality_checks(fail_fast: Optional[bool] = None) -> None:
     """
     Runs expectation suites on source tables and writes a markdown report:
       - clientes: no nulls in id, email; email contains '@'
@@ -78,105 +169,184 @@ def run_quality_checks() -> None:
       - transacoes: non-null foreign keys, valid timestamp
       - transacao_itens: positive quantity and price
     Also logs a simple lineage section and raises if critical issues exist (alerting).
+    fail_fast (default: config key quality_fail_fast, else False) checks the tables
+    one by one and stops at the first one with errors, writing a partial report.
     """
+    if fail_fast is None:
+        fail_fast = cfg.get("quality_fail_fast", False)
+
+    # Settings read once into locals for the whole run
+    schema = cfg["db_schema"]  # Source normalized schema
+    env = cfg["environment"]  # dev/prod, shown in the report header
+    report_path = REPORT_PATH  # Output markdown report path
+
     os.makedirs(REPORT_DIR, exist_ok=True)  # Ensure logs/ exists
     ts = datetime.utcnow().strftime(
         "%Y-%m-%d %H:%M:%SZ"
     )  # Current UTC timestamp for report header
 
-    # Read data to validate
-    schema = cfg["db_schema"]  # Source normalized schema
+    # Lightweight table constructs (no reflection); Core keeps the SQL f-string free
+    def _table(name: str, *cols: str):
+        return sql_table(name, *[column(c) for c in cols], schema=schema)
+
+    clientes = _table("clientes", "id", "email")
+    produtos = _table("produtos", "id", "preco")
+    transacoes = _table("transacoes", "id", "id_cliente", "data_hora")
+    itens = _table(
+        "transacao_itens",
+        "id",
+        "id_transacao",
+        "id_produto",
+        "quantidade",
+        "preco_unitario",
+    )
+    item_cols = ["id", "id_transacao", "id_produto", "quantidade", "preco_unitario"]
+
+    engine = get_engine()  # Built here, before the worker threads need it
 
-    # CHANGED: use read_sql_table(..., schema=schema) to avoid f-string SQL and satisfy Bandit B608
-    clientes = pd.read_sql_table(
-        "clientes", ENGINE, schema=schema
-    )  # Load customers (safe, no raw SQL)
-    produtos = pd.read_sql_table(
-        "produtos", ENGINE, schema=schema
-    )  # Load products (safe)
-    transacoes = pd.read_sql_table(
-        "transacoes", ENGINE, schema=schema
-    )  # Load transactions (safe)
-    itens = pd.read_sql_table(
-        "transacao_itens", ENGINE, schema=schema
-    )  # Load items (safe)
+    # Skip the checks the schema's own constraints already guarantee
+    with engine.connect() as conn:
+        proven_not_null, proven_positive = _proven_columns(conn, schema)
+
+    def _not_null(t, cols: List[str]) -> Dict[str, object]:
+        return _not_null_checks(
+            t, [c for c in cols if (t.name, c) not in proven_not_null]
+        )
+
+    def _positive(t, cols: List[str]) -> Dict[str, object]:
+        return _positive_checks(
+            t, [c for c in cols if (t.name, c) not in proven_positive]
+        )
+
+    # One aggregate query per table
+    queries = {
+        "clientes": (
+            clientes,
+            {
+                **_not_null(clientes, ["id", "email"]),
+                **_email_checks(clientes, "email"),
+            },
+        ),
+        "produtos": (
+            produtos,
+            {
+                **_not_null(produtos, ["id", "preco"]),
+                **_positive(produtos, ["preco"]),
+            },
+        ),
+        # data_hora is a TIMESTAMP column: every stored value parses, so the only
+        # possible invalid timestamp is a NULL (NaT in the old pandas parse)
+        "transacoes": (
+            transacoes,
+            _not_null(transacoes, ["id", "id_cliente", "data_hora"]),
+        ),
+        "transacao_itens": (
+            itens,
+            {
+                **_not_null(itens, item_cols),
+                **_positive(itens, ["quantidade", "preco_unitario"]),
+            },
+        ),
+    }
+    # A table whose checks are all proven is not scanned at all
+    queries = {name: q for name, q in queries.items() if q[1]}
+
+    def _count(name: str) -> Dict[str, int]:
+        if name not in queries:  # Every check proven by constraints: no scan
+            return {}
+        t, checks = queries[name]
+        with engine.connect() as conn:  # One pooled connection per query
+            return _count_violations(conn, t, checks)
+
+    # Expectation suites: one function per table, check counts -> error messages
+    def _clientes_suite(counts: Dict[str, int]) -> List[str]:
+        errs = _expect_not_null(counts, ["id", "email"])  # id & email not null
+        errs += _expect_valid_email(counts, "email")  # email contains '@'
+        return errs
+
+    def _produtos_suite(counts: Dict[str, int]) -> List[str]:
+        errs = _expect_not_null(counts, ["id", "preco"])  # id & preco not null
+        errs += _expect_positive(counts, ["preco"])  # preco > 0
+        return errs
+
+    def _transacoes_suite(counts: Dict[str, int]) -> List[str]:
+        errs = _expect_not_null(
+            counts, ["id", "id_cliente", "data_hora"]
+        )  # keys & timestamp not null
+        if counts.get("data_hora_nulls"):  # Any invalid timestamp?
+            errs.append("Invalid timestamps in 'data_hora'")  # Record issue
+        return errs
+
+    def _itens_suite(counts: Dict[str, int]) -> List[str]:
+        errs = _expect_not_null(counts, item_cols)  # not nulls
+        errs += _expect_positive(
+            counts, ["quantidade", "preco_unitario"]
+        )  # quantities and price > 0
+        return errs
+
+    suites = {  # Report order
+        "clientes": _clientes_suite,
+        "produtos": _produtos_suite,
+        "transacoes": _transacoes_suite,
+        "transacao_itens": _itens_suite,
+    }
 
     # Run expectation suites
     errors: Dict[str, List[str]] = {}  # Map table -> list of errors
+    if fail_fast:
+        # CI mode: one table at a time, in report order; the first table with
+        # errors stops the run, so the remaining tables are never scanned
+        for name, suite in suites.items():
+            errors[name] = suite(_count(name))
+            if errors[name]:
+                break
+    else:
+        # The four scans are independent and run in the DB: issue them concurrently
+        # (the threads wait on sockets, not on the GIL), wall time = slowest table
+        with ThreadPoolExecutor(max_workers=len(suites)) as pool:
+            futures = {name: pool.submit(_count, name) for name in suites}
+            errors = {name: suites[name](f.result()) for name, f in futures.items()}
+    not_checked = [name for name in suites if name not in errors]
 
-    # clientes expectations
-    clients_errs = []
-    clients_errs += _expect_not_null(clientes, ["id", "email"])  # id & email not null
-    clients_errs += _expect_valid_email(clientes, "email")  # email contains '@'
-    errors["clientes"] = clients_errs  # Record errors
-
-    # produtos expectations
-    prod_errs = []
-    prod_errs += _expect_not_null(produtos, ["id", "preco"])  # id & preco not null
-    prod_errs += _expect_positive(produtos, ["preco"])  # preco > 0
-    errors["produtos"] = prod_errs  # Record errors
-
-    # transacoes expectations
-    trx_errs = []
-    trx_errs += _expect_not_null(
-        transacoes, ["id", "id_cliente", "data_hora"]
-    )  # keys & timestamp not null
-    # Simple parse check: if parsing yields NaT, it's invalid (vectorized)
-    if (
-        pd.to_datetime(transacoes["data_hora"], errors="coerce").isna().any()
-    ):  # Any invalid timestamp?
-        trx_errs.append("Invalid timestamps in 'data_hora'")  # Record issue
-    errors["transacoes"] = trx_errs  # Record errors
-
-    # transacao_itens expectations
-    item_errs = []
-    item_errs += _expect_not_null(
-        itens, ["id", "id_transacao", "id_produto", "quantidade", "preco_unitario"]
-    )  # not nulls
-    item_errs += _expect_positive(
-        itens, ["quantidade", "preco_unitario"]
-    )  # quantities and price > 0
-    errors["transacao_itens"] = item_errs  # Record errors
-
-    # Summarize results
-    total_issues = sum(
-        len(v) for v in errors.values()
-    )  # Total count of issues across tables
-
-    # Write markdown report including lineage notes
-    with open(REPORT_PATH, "w", encoding="utf-8") as f:  # Open report file
-        f.write(f"# Data Quality Report\n\n")  # Title
-        f.write(f"- Generated at: {ts}\n")  # Timestamp
-        f.write(f"- Environment: **{cfg['environment']}**\n\n")  # Show environment
-        f.write("## Lineage (simplified)\n")  # Lineage header
-        f.write(
-            "- Source: PostgreSQL normalized schema (Iteration 2 load)\n"
-        )  # Source lineage
-        f.write(
-            f"- Schema: `{schema}` → Validated tables: clientes, produtos, transacoes, transacao_itens\n"
+    # Build the markdown report as a list of lines, counting issues along the
+    # way; written with a single write() below. The header (title, timestamp,
+    # environment, lineage notes) is one f-string
+    lines: List[str] = [
+        f"# Data Quality Report\n\n"
+        f"- Generated at: {ts}\n"
+        f"- Environment: **{env}**\n\n"
+        "## Lineage (simplified)\n"
+        "- Source: PostgreSQL normalized schema (Iteration 2 load)\n"
+        f"- Schema: `{schema}` → Validated tables: clientes, produtos, transacoes, transacao_itens\n"
+        "- Downstream targets: warehouse schema tables (Iteration 3)\n\n"
+        "## Expectations Summary\n\n"
+    ]
+    total_issues = 0  # Total count of issues across tables
+    for table, errs in errors.items():  # For each table
+        lines.append(f"### {table}\n")  # Table header
+        if not errs:  # If no errors
+            lines.append("- ✅ No issues found\n\n")  # Mark as OK
+        else:  # If issues present
+            lines.extend(f"- ❌ {e}\n" for e in errs)  # List each issue
+            lines.append("\n")
+            total_issues += len(errs)
+    if not_checked:  # fail_fast stopped early: say what was not validated
+        lines.append(
+            f"- ⏭️ Stopped at the first failing table (fail_fast); not checked: {', '.join(not_checked)}\n\n"
         )
-        f.write(
-            "- Downstream targets: warehouse schema tables (Iteration 3)\n\n"
-        )  # Downstream lineage
-        f.write("## Expectations Summary\n\n")  # Summary header
-        for table, errs in errors.items():  # For each table
-            f.write(f"### {table}\n")  # Table header
-            if not errs:  # If no errors
-                f.write("- ✅ No issues found\n\n")  # Mark as OK
-            else:  # If issues present
-                for e in errs:  # List each issue
-                    f.write(f"- ❌ {e}\n")
-                f.write("\n")
-        f.write(f"**Total issues:** {total_issues}\n")  # Overall count
+    lines.append(f"**Total issues:** {total_issues}\n")  # Overall count
+
+    with open(report_path, "w", encoding="utf-8") as f:  # Open report file
+        f.write("".join(lines))
 
     # Alerting: if critical issues found, log error and raise to make CI/CD or orchestration fail fast
     if total_issues > 0:  # If there are any issues
         log.error(
-            f"Data quality failed with {total_issues} issues. See {REPORT_PATH}"
+            f"Data quality failed with {total_issues} issues. See {report_path}"
         )  # Log location
         raise SystemExit(1)  # Non-zero exit to trigger alerting
     else:
-        log.info(f"Data quality passed. Report at {REPORT_PATH}")  # Success log
+        log.info(f"Data quality passed. Report at {report_path}")  # Success log
 
 
 if __name__ == "__main__":  # Entry point for running checks directly
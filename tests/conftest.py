@@ -40,6 +40,22 @@ def build_db_url(cfg=None):
 
 # Create a dummy module object exposing get_config/build_db_url.
 _config_loader_stub = types.SimpleNamespace(get_config=get_config, build_db_url=build_db_url)
+_MISSING = object()
+_previous_config_loader = _MISSING
 
-# Inject it so `from config.config_loader import ...` resolves to this stub.
-sys.modules["config.config_loader"] = _config_loader_stub
+def pytest_configure(config):
+    """
+    Inject the stub so `from config.config_loader import ...` resolves to it.
+    Test modules import the app at collection time, so this has to happen
+    before collection (a fixture would run too late).
+    """
+    global _previous_config_loader
+    _previous_config_loader = sys.modules.get("config.config_loader", _MISSING)
+    sys.modules["config.config_loader"] = _config_loader_stub
+
+def pytest_unconfigure(config):
+    """Restore whatever was there before, so nothing leaks past the test session."""
+    if _previous_config_loader is _MISSING:
+        sys.modules.pop("config.config_loader", None)
+    else:
+        sys.modules["config.config_loader"] = _previous_config_loader
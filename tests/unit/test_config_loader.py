@@ -0,0 +1,52 @@
+# tests/unit/test_config_loader.py
+# ------------------------------------------------------------
+# Purpose: Unit tests for the ${VAR} substitution helpers in
+#          config/config_loader.py (no files, no DB).
+# conftest.py replaces `config.config_loader` in sys.modules with a
+# stub, so the real module is loaded straight from its file here.
+# ------------------------------------------------------------
+
+import importlib.util
+from pathlib import Path
+
+_PATH = Path(__file__).resolve().parents[2] / "config" / "config_loader.py"
+_spec = importlib.util.spec_from_file_location("_real_config_loader", _PATH)
+config_loader = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(config_loader)
+
+
+def test_substitute_env_placeholders_replaces_known_and_missing(monkeypatch):
+    monkeypatch.setenv("PGUSER", "alice")
+    monkeypatch.delenv("PGPASSWORD", raising=False)
+    text = "user: ${PGUSER}\npassword: ${PGPASSWORD}\n"
+    # Known vars get their value; unknown ones become a <MISSING:...> sentinel.
+    assert config_loader._substitute_env_placeholders(text) == (
+        "user: alice\npassword: <MISSING:PGPASSWORD>\n"
+    )
+
+
+def test_substitute_env_placeholders_leaves_non_placeholders_alone(monkeypatch):
+    monkeypatch.setenv("A", "x")
+    # Empty names, unterminated and nested braces are not placeholders.
+    assert config_loader._substitute_env_placeholders("${} ${A") == "${} ${A"
+    assert config_loader._substitute_env_placeholders("${a${A}") == "${ax"
+    # Text without "${" is returned untouched (fast path).
+    assert config_loader._substitute_env_placeholders("plain: 1") == "plain: 1"
+
+
+def test_substitute_in_tree_keeps_env_values_as_strings(monkeypatch):
+    monkeypatch.setenv("PGPORT", "5432")
+    monkeypatch.setenv("PGHOST", "db")
+    monkeypatch.setenv("PGPASSWORD", "0123")
+    tree = {
+        "database": {"port": "${PGPORT}", "password": "${PGPASSWORD}", "url": "${PGHOST}:${PGPORT}"},
+        "n": 1,
+    }
+    out = config_loader._substitute_in_tree(tree)
+    # Only known numeric keys are converted.
+    assert out["database"]["port"] == 5432
+    # Secrets keep their exact text (no YAML re-typing to int/bool/dict).
+    assert out["database"]["password"] == "0123"
+    # Placeholders embedded in a longer string stay strings.
+    assert out["database"]["url"] == "db:5432"
+    assert out["n"] == 1
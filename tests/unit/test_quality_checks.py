@@ -0,0 +1,60 @@
+# tests/unit/test_quality_checks.py
+# ------------------------------------------------------------
+# Unit tests for the server-side expectation counts in
+# src/quality/quality_checks.py, run against in-memory SQLite
+# (conftest.py points build_db_url at sqlite:///:memory:).
+# ------------------------------------------------------------
+
+from sqlalchemy import column, create_engine, table, text
+from src.quality.quality_checks import (
+    _count_violations,
+    _email_checks,
+    _expect_not_null,
+    _expect_positive,
+    _expect_valid_email,
+    _is_positive_check,
+    _not_null_checks,
+    _positive_checks,
+)
+
+
+def test_violation_counts_come_from_one_aggregate_query():
+    engine = create_engine("sqlite:///:memory:")
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE produtos (id INT, email TEXT, preco REAL)"))
+        conn.execute(
+            text(
+                "INSERT INTO produtos VALUES "
+                "(1, 'a@b.pt', 10.0), (NULL, 'no-at', 0), (3, 'c@d.pt', -2.5)"
+            )
+        )
+        t = table("produtos", column("id"), column("email"), column("preco"))
+        counts = _count_violations(
+            conn,
+            t,
+            {
+                **_not_null_checks(t, ["id", "email"]),
+                **_positive_checks(t, ["preco"]),
+                **_email_checks(t, "email"),
+            },
+        )
+
+    assert counts == {
+        "id_nulls": 1,
+        "email_nulls": 0,
+        "preco_non_positive": 2,
+        "email_invalid": 1,
+    }
+    # The expectations turn non-zero counts into report messages
+    assert _expect_not_null(counts, ["id", "email"]) == ["Nulls found in column 'id'"]
+    assert _expect_positive(counts, ["preco"]) == ["Non-positive values in column 'preco'"]
+    assert _expect_valid_email(counts, "email") == ["Invalid email addresses in 'email'"]
+
+
+def test_only_plain_positive_check_constraints_prove_a_column():
+    # Definitions as returned by pg_get_constraintdef()
+    assert _is_positive_check("CHECK ((quantidade > 0))", "quantidade")
+    assert _is_positive_check("CHECK ((preco > (0)::numeric))", "preco")
+    assert not _is_positive_check("CHECK ((preco >= 0))", "preco")
+    assert not _is_positive_check("CHECK ((preco > 0))", "quantidade")
+    assert not _is_positive_check("CHECK (((preco > 0) OR (id > 0)))", "preco")
@@ -6,6 +6,8 @@
 
 # Import the helpers we want to test from your validator module.
 from src.data_validator import is_valid_email, is_valid_date
+from src.data_validator import _valid_dates, _valid_emails, _parse_floats
+import pandas as pd
 
 
 def test_is_valid_email_accepts_basic_addresses():
@@ -27,6 +29,9 @@ def test_is_valid_date_accepts_supported_formats():
     assert is_valid_date("2025-10-26") is True
     # Format YYYY-MM-DD HH:MM:SS should be valid.
     assert is_valid_date("2025-10-26 19:30:45") is True
+    # Like strptime, month/day/time fields need not be zero-padded.
+    assert is_valid_date("2025-1-5") is True
+    assert is_valid_date("2025-1-5 7:3:9") is True
 
 
 def test_is_valid_date_rejects_unsupported_formats():
@@ -34,3 +39,50 @@ def test_is_valid_date_rejects_unsupported_formats():
     assert is_valid_date("26/10/2025") is False
     # An impossible date should be rejected by the parser.
     assert is_valid_date("2025-13-40") is False
+    # Other ISO 8601 shapes (week dates, 'T' separator) are not supported formats.
+    assert is_valid_date("2025-W43-1") is False
+    assert is_valid_date("2025-10-26T19:30:45") is False
+    # Neither are UTC offsets, leap days in common years or leap seconds.
+    assert is_valid_date("2025-10-26 19+01:00") is False
+    assert is_valid_date("2025-02-29") is False
+    assert is_valid_date("2025-10-26 23:59:60") is False
+
+
+def test_column_helpers_match_row_helpers():
+    # The vectorized date check agrees with is_valid_date value by value.
+    dates = pd.Series(
+        ["2025-10-26", "2025-10-26 19:30:45", "2025-1-5", "2025-13-40", "0000-01-01", ""]
+    )
+    assert _valid_dates(dates).tolist() == [is_valid_date(d) for d in dates]
+    assert _valid_dates(dates).tolist() == [True, True, True, False, False, False]
+    # Same for emails, including non-ASCII names and a trailing newline.
+    emails = pd.Series(["gonçalo.silva.1@exemplo.pt", "a@b.pt\n", "user@localhost", "x@y.com"])
+    assert _valid_emails(emails).tolist() == [is_valid_email(e) for e in emails]
+    assert _valid_emails(emails).tolist() == [True, False, False, True]
+    # Unparseable text is flagged; a literal "nan" parses (like float("nan")).
+    floats, invalid = _parse_floats(pd.Series(["12.5", "-1", "abc", "", "nan"]))
+    assert invalid.tolist() == [False, False, True, True, False]
+    assert floats.iloc[1] == -1
+    # int()/float() also accept underscores and non-ASCII digits.
+    floats, invalid = _parse_floats(pd.Series(["1_000.5", "١٢"]))
+    assert invalid.tolist() == [False, False] and floats.tolist() == [1000.5, 12.0]
+
+
+def test_validate_csv_checks_rows_longer_than_header(tmp_path, monkeypatch):
+    """A row with extra fields is reported, and the file is still checked row by row."""
+    import io
+    import src.data_validator as dv
+
+    (tmp_path / "transacao_itens.csv").write_text(
+        "id,quantidade,preco_unitario\n1,2,3.5,oops\n2,0,1_000\n3,x,4\n",
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(dv, "data_dir", str(tmp_path))
+    out = io.StringIO()
+    dv.validate_csv("transacao_itens.csv", out)
+    assert out.getvalue().splitlines() == [
+        "[transacao_itens.csv] Row 1: 1 extra field(s)",
+        "[transacao_itens.csv] Row 2: Non-positive quantity '0'",
+        "[transacao_itens.csv] Row 3: Invalid quantity 'x'",
+        "[OK] Finished validating transacao_itens.csv",
+    ]
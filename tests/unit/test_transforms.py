@@ -45,3 +45,28 @@ def test_prepare_transaction_fact_and_followups():
     assert sorted(daily["daily_revenue"].tolist()) == [15.0, 20.0]
     assert len(weekly) == 1
     assert len(monthly) == 1
+
+def test_recommendations_count_pairs_like_a_self_join():
+    # Basket 1 has product 101 twice: each of its rows pairs with 102
+    fact = pd.DataFrame(
+        {"transaction_id": [1, 1, 1, 2, 2, 3], "product_id": [101, 101, 102, 101, 103, 104]}
+    )
+
+    recs = transform_recommendations(fact)
+
+    counts = {
+        (x, y): n
+        for x, y, n in recs[["product_id_x", "product_id_y", "co_purchase_count"]].itertuples(index=False)
+    }
+    assert counts == {(101, 102): 2, (102, 101): 2, (101, 103): 1, (103, 101): 1}
+
+def test_clv_keys_stay_integer_when_a_transaction_is_missing():
+    # Item 2 points at a transaction that does not exist: NaN customer
+    fact = pd.DataFrame(
+        {"customer_id": [11.0, float("nan")], "total_linha": [20.0, 5.0]}
+    )
+
+    clv = transform_clv(fact)
+
+    assert clv["customer_id"].tolist() == [11]
+    assert clv.to_csv(index=False, header=False) == "11,20.0\n"